@@ -0,0 +1,83 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_PATH = os.environ.get("LLM_CACHE_PATH", "llm_cache.sqlite3")
+DEFAULT_TTL = 7 * 24 * 60 * 60  # 7 days
+
+_lock = threading.Lock()
+_conn = None
+
+
+def _get_conn():
+    """
+    Lazily open the shared SQLite connection and create the cache table.
+
+    Returns:
+        sqlite3.Connection: Connection to the on-disk cache
+    """
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(CACHE_PATH, check_same_thread=False)
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "hash TEXT PRIMARY KEY, response BLOB, expires_at INT)"
+        )
+        _conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_llm_cache_expires_at ON llm_cache (expires_at)"
+        )
+        _conn.commit()
+    return _conn
+
+
+def cache_key(*parts):
+    """
+    Build a cache key from the pieces that determine an LLM response.
+
+    Args:
+        *parts (str): Model id, prompt, input payload, ...
+
+    Returns:
+        str: SHA-256 hex digest of the joined parts
+    """
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+
+def get(key):
+    """
+    Look up a cached LLM response.
+
+    Args:
+        key (str): Key built with cache_key
+
+    Returns:
+        str: Cached response, or None on a miss or expired entry
+    """
+    with _lock:
+        row = _get_conn().execute(
+            "SELECT response FROM llm_cache WHERE hash = ? AND expires_at > ?",
+            (key, int(time.time())),
+        ).fetchone()
+    return row[0] if row else None
+
+
+def put(key, response, ttl=DEFAULT_TTL):
+    """
+    Store an LLM response and drop entries that have expired.
+
+    Args:
+        key (str): Key built with cache_key
+        response (str): Raw LLM response text
+        ttl (int): Seconds the entry stays valid
+    """
+    now = int(time.time())
+    with _lock:
+        conn = _get_conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (hash, response, expires_at) VALUES (?, ?, ?)",
+            (key, response, now + ttl),
+        )
+        conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+        conn.commit()
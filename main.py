@@ -6,19 +6,36 @@ import fitz  # PyMuPDF
 import uuid
 import os
 import re
-from pinecone import Pinecone, ServerlessSpec
+from pinecone import ServerlessSpec
+from pinecone.grpc import PineconeGRPC
+from google.protobuf.json_format import MessageToDict
 import time
 import firebase_admin
 from firebase_admin import credentials, firestore
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from typing import List,Dict,Any, Optional,Union
-import base64
+import pybase64 as base64  # SIMD drop-in for the stdlib module
 import json
+import asyncio
+import io
+import sqlite3
+import functools
+from concurrent.futures import ThreadPoolExecutor
+import threading
+from cachetools import TTLCache
 from mistralai import Mistral
 from datetime import datetime
 from pydantic import BaseModel
-from app.prompts.prompts_library import first_prompt, middle_prompt, last_prompt
-from app.service_log.combine_answer import merge_json_blocks
+from PIL import Image, ImageOps
+from app.prompts.prompts_library import (
+    COMMON_FORMATTING_PREFIX,
+    FIRST_PAGE_SUFFIX,
+    MIDDLE_PAGE_SUFFIX,
+    LAST_PAGE_SUFFIX,
+    PROMPT_VERSION,
+)
+from app.service_log.combine_answer import merge_parsed_blocks, parse_json_block
+from app.service_log import llm_cache
 from datetime import datetime
 from dotenv import load_dotenv
 from enum import Enum
@@ -47,9 +64,17 @@ REGION = os.environ.get("REGION")
 CLOUD = os.environ.get("CLOUD")
 
 EMBEDDING_MODEL = 'BAAI/bge-large-en-v1.5'
+# "torch" (default) or "onnx"; with onnx, EMBEDDING_ONNX_FILE may select a quantized
+# export such as "onnx/model_qint8_avx512_vnni.onnx"
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+EMBEDDING_ONNX_FILE = os.environ.get("EMBEDDING_ONNX_FILE")
+# Unset lets sentence-transformers pick cuda when available; set "cpu" to pin CPU-only deploys
+EMBEDDING_DEVICE = os.environ.get("EMBEDDING_DEVICE")
+# Half precision on GPU (torch backend only); set to "0" to keep fp32
+EMBEDDING_FP16 = os.environ.get("EMBEDDING_FP16", "1") == "1"
 
 # ---- Init ----
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -57,9 +82,21 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-model = SentenceTransformer(EMBEDDING_MODEL)
+model = SentenceTransformer(
+    EMBEDDING_MODEL,
+    backend=EMBEDDING_BACKEND,
+    device=EMBEDDING_DEVICE,
+    model_kwargs={"file_name": EMBEDDING_ONNX_FILE} if EMBEDDING_ONNX_FILE else None,
+)
+if EMBEDDING_FP16 and EMBEDDING_BACKEND == "torch" and model.device.type == "cuda":
+    model.half()
 text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=100)
-pc = Pinecone(api_key=API_KEY)
+# Blocking work from async handlers: one encode thread (torch already parallelises
+# inside encode), and a small pool for Pinecone / Firestore round-trips
+encode_pool = ThreadPoolExecutor(max_workers=1)
+io_pool = ThreadPoolExecutor(max_workers=4)
+# gRPC data plane: vectors travel as packed float32 protobuf instead of JSON text
+pc = PineconeGRPC(api_key=API_KEY)
 
 if INDEX_NAME not in pc.list_indexes().names():
     pc.create_index(
@@ -71,13 +108,23 @@ if INDEX_NAME not in pc.list_indexes().names():
 index = pc.Index(INDEX_NAME)
 
 # ---- Utils ----
+# Newline runs and other whitespace runs both collapse to one space, in one pass
+_WHITESPACE_RE = re.compile(r'\s*\n\s*|\s{2,}')
+_DISALLOWED_RE = re.compile(r'[^\x20-\x7E\u0900-\u097F.,!?()"\':; \n]')
+
 def clean_text(text):
-    text = re.sub(r'\n+', ' ', text)
-    text = re.sub(r'\s{2,}', ' ', text)
-    text = re.sub(r'[^\x20-\x7E\u0900-\u097F.,!?()"\':; \n]', '', text)
+    text = _WHITESPACE_RE.sub(' ', text)
+    text = _DISALLOWED_RE.sub('', text)
     return text.strip()
 
 
+# Cleaned page text is appended as it is produced instead of collecting a list of pages first
+def extract_pdf_text(contents: bytes) -> str:
+    buf = io.StringIO()
+    with fitz.open(stream=contents, filetype="pdf") as doc:
+        for page in doc:
+            buf.write(clean_text(page.get_text()))
+    return buf.getvalue()
 
 MISTRAL_API_KEY = os.environ.get("MISTRAL_API_KEY")
 client = Mistral(api_key=MISTRAL_API_KEY)
@@ -100,59 +147,138 @@ class FinetuningData(BaseModel):
     login_id: str
     paperType : str
 
+# Longest image edge sent to the OCR model
+OCR_MAX_EDGE = 1024
+
 # Function to encode image content to base64
 def encode_image(file_bytes: bytes) -> str:
     return base64.b64encode(file_bytes).decode("utf-8")
 
+# Downscale large photos before upload; smaller images are passed through untouched
+def resize_for_ocr(image_bytes: bytes, max_edge: int = OCR_MAX_EDGE) -> bytes:
+    img = Image.open(io.BytesIO(image_bytes))
+    if max(img.size) <= max_edge:
+        return image_bytes
+
+    # Re-encoding drops EXIF, so bake the Orientation tag in first (phone photos)
+    img = ImageOps.exif_transpose(img)
+    img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    buf = io.BytesIO()
+    img.convert("RGB").save(buf, "JPEG", quality=85)
+    return buf.getvalue()
+
+# Resize then base64-encode one uploaded page; runs in a worker thread
+def prepare_image(image_bytes: bytes) -> str:
+    return encode_image(resize_for_ocr(image_bytes))
+
+OCR_MODEL = "pixtral-large-latest"
+REPAIR_MODEL = "mistral-large-latest"
+# Max number of in-flight Mistral OCR calls per summarize request (tune to the account rate limit)
+OCR_CONCURRENCY = int(os.environ.get("OCR_CONCURRENCY", "5"))
+
+# Identical for every page and every request, so it forms a stable prompt prefix:
+# the shared formatting guide lives here and only the page-specific part varies
+OCR_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": """You are an expert summarizer.
+                Always focus only on the meaningful educational content, such as study material, questions, instructions, and diagrams.
+                Ignore irrelevant information such as notebook headers, coaching institute names (e.g., "Ravi IAS"), page margins, watermarks, "don't write on this side," or any other non-content markings.
+                Your task is to extract and summarize only the core content clearly and precisely
+                 **Strict JSON Output**  
+                    - Your response MUST be pure, valid JSON  
+                    - NO Markdown code blocks (```json) or extra text outside the JSON  
+                    - Use double quotes for all strings  """ + COMMON_FORMATTING_PREFIX
+}
+
 # Summarization function for multiple images
-def summarize_images(encoded_images: List[str]) -> str:
+async def summarize_images(encoded_images: List[str]) -> str:
     if not encoded_images:
         return {"error": "No images provided"}
 
-    outputs = []
-    system_message = {
-        "role": "system",
-        "content": """You are an expert summarizer.
-                    Always focus only on the meaningful educational content, such as study material, questions, instructions, and diagrams.
-                    Ignore irrelevant information such as notebook headers, coaching institute names (e.g., "Ravi IAS"), page margins, watermarks, "don't write on this side," or any other non-content markings.
-                    Your task is to extract and summarize only the core content clearly and precisely
-                     **Strict JSON Output**  
-                        - Your response MUST be pure, valid JSON  
-                        - NO Markdown code blocks (```json) or extra text outside the JSON  
-                        - Use double quotes for all strings  """
-    }
-    for idx, img in enumerate(encoded_images):
-        if idx == 0:
-            prompt = first_prompt
-        elif idx == len(encoded_images) - 1:
-            prompt = last_prompt
-        else:
-            prompt = middle_prompt
+    n = len(encoded_images)
+    prompts = (
+        [FIRST_PAGE_SUFFIX] if n == 1
+        else [FIRST_PAGE_SUFFIX] + [MIDDLE_PAGE_SUFFIX] * (n - 2) + [LAST_PAGE_SUFFIX]
+    )
+    url_prefix = "data:image/jpeg;base64,"
+    sem = asyncio.Semaphore(OCR_CONCURRENCY)
 
+    async def _process_one(idx: int, img: str) -> Optional[dict]:
+        prompt = prompts[idx]
         message = [
-            system_message,
+            OCR_SYSTEM_MESSAGE,
             {
                 "role": "user",
                 "content": [
                     {"type": "text", "text": prompt},
-                    {"type": "image_url", "image_url": f"data:image/jpeg;base64,{img}"}
+                    {"type": "image_url", "image_url": url_prefix + img}
                 ]
             }
         ]
 
-        response = client.chat.complete(
-            model="pixtral-large-latest",
-            messages=message,
-            max_tokens=2000,
-            temperature=0.2,
-        )
-
+        # Identical page + prompt + model -> reuse the previous response
+        key = llm_cache.cache_key(OCR_MODEL, PROMPT_VERSION, OCR_SYSTEM_MESSAGE["content"], prompt, img)
+        # The cache is best-effort: a locked or unwritable database counts as a miss
+        try:
+            cached = await asyncio.to_thread(llm_cache.get, key)
+        except sqlite3.Error as e:
+            print(f"LLM cache read failed: {e}")
+            cached = None
+        if cached is not None:
+            return await asyncio.to_thread(parse_json_block, cached)
+
+        async with sem:
+            response = await client.chat.complete_async(
+                model=OCR_MODEL,
+                messages=message,
+                max_tokens=2000,
+                temperature=0.2,
+            )
         output_text = response.choices[0].message.content
-        outputs.append(output_text)
+        # Parsed once, off the event loop (the json5 fallback can take 100+ ms); the merge reuses it
+        parsed = await asyncio.to_thread(parse_json_block, output_text)
+
+        # Unparseable reply: one small text-only repair call instead of re-running OCR
+        if parsed is None:
+            async with sem:
+                repair = await client.chat.complete_async(
+                    model=REPAIR_MODEL,
+                    messages=[{
+                        "role": "user",
+                        "content": "Fix this to valid JSON, respond with JSON only:\n" + output_text,
+                    }],
+                    max_tokens=2000,
+                    temperature=0,
+                )
+            repaired_text = repair.choices[0].message.content
+            parsed = await asyncio.to_thread(parse_json_block, repaired_text)
+            if parsed is not None:
+                output_text = repaired_text
+
+        # Only usable replies are cached, so a bad page is retried on resubmission
+        if parsed is not None:
+            try:
+                await asyncio.to_thread(llm_cache.put, key, output_text)
+            except sqlite3.Error as e:
+                print(f"LLM cache write failed: {e}")
+        return parsed
+
+    # Send every page to the model concurrently; results keep page order
+    results = await asyncio.gather(
+        *(_process_one(idx, img) for idx, img in enumerate(encoded_images)),
+        return_exceptions=True,
+    )
+    # Failed and unparseable pages are dropped; the merge raises if none are left
+    parsed_pages = []
+    for idx, result in enumerate(results):
+        if isinstance(result, Exception):
+            print(f"MistralAI OCR Error on image {idx + 1}: {result}")
+        elif result is None:
+            print(f"Could not parse the OCR reply for image {idx + 1}")
+        else:
+            parsed_pages.append(result)
 
-    # Send each message to model and collect outputs 
-    merge_output = merge_json_blocks(outputs)
-    return merge_output
+    return merge_parsed_blocks(parsed_pages)
     
 
 @app.post("/upload-pdf")
@@ -167,8 +293,13 @@ async def upload_pdf(data: dict):
         raise HTTPException(status_code=400, detail="No extracted text provided.")
 
     try:
+        loop = asyncio.get_running_loop()
         chunks = text_splitter.split_text(extracted_text)
-        embeddings = model.encode(chunks).tolist()
+        # Repeated headers/footers give identical chunks: run the model once per distinct text
+        unique_chunks = list(dict.fromkeys(chunks))
+        unique_embeddings = await loop.run_in_executor(encode_pool, functools.partial(model.encode, unique_chunks, batch_size=64))
+        embedding_by_chunk = dict(zip(unique_chunks, unique_embeddings.tolist()))
+        embeddings = [embedding_by_chunk[chunk] for chunk in chunks]
 
         # IDs
         document_id = str(uuid.uuid4())
@@ -179,25 +310,36 @@ async def upload_pdf(data: dict):
             "timestamp": datetime.utcnow().isoformat(),
             "file_name": file_name,
         }
-        db.collection("Resource-list").add(doc_data)
+        # Explicit ID: the Firestore doc ID equals document_id, so the record can be fetched directly
+        doc_ref = db.collection("Resource-list").document(document_id)
+        await loop.run_in_executor(io_pool, doc_ref.set, doc_data)
         print(f"📚 Resource saved: {book_title} ({document_id})")
 
-        # Upsert to Pinecone
-        batch_size = 50
-        for i in range(0, len(chunks), batch_size):
-            batch = [
+        # Upsert to Pinecone; batches go out in parallel on io_pool
+        batch_size = 100
+        # Short "<document_id>:<n>" IDs instead of a uuid4 per chunk. document_id is fresh per
+        # upload, so re-uploading the same PDF still stores a second copy of its vectors
+        ids = [f"{document_id}:{i}" for i in range(len(chunks))]
+        batches = [
+            [
                 (
-                    str(uuid.uuid4()),  # vector ID
+                    vec_id,
                     emb,
                     {
                         "text": chunk,
                         "document_id": document_id,
                     }
                 )
-                for chunk, emb in zip(chunks[i:i + batch_size], embeddings[i:i + batch_size])
+                for vec_id, chunk, emb in zip(
+                    ids[i:i + batch_size], chunks[i:i + batch_size], embeddings[i:i + batch_size]
+                )
             ]
-            index.upsert(batch)
-            print(f"✅ Batch {i // batch_size + 1}: Upserted {len(batch)} chunks")
+            for i in range(0, len(chunks), batch_size)
+        ]
+        await asyncio.gather(*(loop.run_in_executor(io_pool, index.upsert, batch) for batch in batches))
+        print(f"✅ Upserted {len(chunks)} chunks in {len(batches)} batches")
+        with query_cache_lock:
+            query_cache.clear()
 
         return {
             "message": "Extracted text indexed successfully.",
@@ -216,8 +358,7 @@ async def review_pdf(file: UploadFile = File(...)):
 
     try:
         contents = await file.read()
-        doc = fitz.open(stream=contents, filetype="pdf")
-        text = "".join([clean_text(page.get_text()) for page in doc])
+        text = await asyncio.to_thread(extract_pdf_text, contents)
         return text
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -229,15 +370,33 @@ def delete_document(document_id: str):
     try:
         # Find vector ids with the given document_id (this only works if metadata filtering is supported)
         response = index.delete(filter={"document_id": {"$eq": document_id}})
-        return {"message": "Document deleted successfully.", "result": response}
+        with query_cache_lock:
+            query_cache.clear()
+        # gRPC returns a protobuf message, which FastAPI cannot encode as-is
+        return {"message": "Document deleted successfully.", "result": MessageToDict(response)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # ---- 3. Query ----
+# Hot queries skip re-embedding and the Pinecone round-trip. Results can be up to
+# QUERY_CACHE_TTL seconds stale: uploads/deletes only clear this worker's cache, and
+# Pinecone serverless writes are eventually consistent, so a query just after an
+# upload may cache results that miss the new vectors.
+QUERY_CACHE_TTL = int(os.environ.get("QUERY_CACHE_TTL", "30"))
+query_cache = TTLCache(maxsize=1024, ttl=QUERY_CACHE_TTL)
+query_cache_lock = threading.Lock()
+
 @app.post("/query")
 def query_pinecone(payload: dict):
     try:
         query = payload.get("query")
+        # The BGE tokenizer strips and lower()s its input, so these variants embed identically
+        cache_key = query.strip().lower()
+        with query_cache_lock:
+            cached = query_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         query_vector = model.encode(query).tolist()
         response = index.query(vector=query_vector, top_k=10, include_metadata=True)
 
@@ -245,7 +404,10 @@ def query_pinecone(payload: dict):
             {"text": match.metadata.get("text"), "score": match.score}
             for match in response.matches
         ]
-        return {"matches": results}
+        result = {"matches": results}
+        with query_cache_lock:
+            query_cache[cache_key] = result
+        return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -253,7 +415,8 @@ def query_pinecone(payload: dict):
 @app.get("/resources-list")
 def list_documents():
     try:
-        docs_ref = db.collection("Resource-list")
+        # Server-side projection: only the fields returned below come over the wire
+        docs_ref = db.collection("Resource-list").select(["book_title", "file_name", "document_id", "timestamp"])
         docs = docs_ref.stream()
 
         documents_list = []
@@ -278,18 +441,24 @@ async def summarize_images_endpoint(files: List[UploadFile] = File(...)):
     if not files:
         raise HTTPException(status_code=400, detail="No files uploaded.")
 
-    base64_images = []
-    
-
     for file in files:
-        print(len(files)) 
         if not file.content_type.startswith("image/"):
             raise HTTPException(status_code=400, detail=f"{file.filename} is not a valid image.")
+
+    async def _prepare(file: UploadFile) -> str:
         content = await file.read()
-        base64_images.append(encode_image(content))
+        if not content:
+            raise HTTPException(status_code=400, detail=f"{file.filename} is empty.")
+        try:
+            return await asyncio.to_thread(prepare_image, content)
+        except Exception:
+            raise HTTPException(status_code=400, detail=f"{file.filename} is not a valid image.")
 
-    raw_output = summarize_images(base64_images)   
-    return JSONResponse(content={"output": raw_output}, media_type="application/json")
+    # Resize + encode every page concurrently in worker threads; order is preserved
+    base64_images = await asyncio.gather(*(_prepare(file) for file in files))
+
+    raw_output = await summarize_images(base64_images)   
+    return ORJSONResponse(content={"output": raw_output})
 
 
 @app.post("/api/save-finetuning")
@@ -300,18 +469,11 @@ async def save_finetuning(data: FinetuningData):
         doc_data = {
             "unique_id": unique_id,
             "timestamp": timestamp,
-            "login_id": data.login_id,
-            "question": data.question,
-            "answer": data.answer,
-            "feedback": [item.dict() for item in data.feedback],
-            "total_marks": data.total_marks,
-            "maximum_marks": data.maximum_marks,
-            "word_limit": data.word_limit,
-            "hand_writting_and_clarity": data.hand_writting_and_clarity,
-            "paperType": data.paperType
+            **data.model_dump(mode="json"),
         }
 
         db.collection("handWrittenAnswerData").document(unique_id).set(doc_data)
+        _stats_cache["total_count"] = None
 
         return {"message": "Data saved successfully", "unique_id": unique_id}
 
@@ -319,12 +481,21 @@ async def save_finetuning(data: FinetuningData):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Absorbs dashboard polling; cleared whenever a new sample is saved
+STATS_CACHE_TTL = 60
+_stats_cache = {"total_count": None, "expires_at": 0.0}
+
 @app.get("/api/get-finetuning-stats")
 async def get_finetuning_stats():
     try:
-        docs = db.collection("handWrittenAnswerData").limit(1000).stream()
-        total = sum(1 for _ in docs)
-        return {"total_count": total}
+        now = time.time()
+        if _stats_cache["total_count"] is None or now >= _stats_cache["expires_at"]:
+            # Server-side count aggregation: no documents are streamed back
+            count_query = db.collection("handWrittenAnswerData").limit(1000).count()
+            result = await asyncio.get_running_loop().run_in_executor(io_pool, count_query.get)
+            _stats_cache["total_count"] = int(result[0][0].value)
+            _stats_cache["expires_at"] = now + STATS_CACHE_TTL
+        return {"total_count": _stats_cache["total_count"]}
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
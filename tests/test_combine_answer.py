@@ -0,0 +1,47 @@
+import unittest
+
+from app.service_log.combine_answer import merge_json_blocks, parse_json_block
+
+
+class ParseJsonBlockTest(unittest.TestCase):
+    def test_object_without_page_fields_is_rejected(self):
+        self.assertIsNone(parse_json_block("{}"))
+        self.assertIsNone(parse_json_block('{"total_marks": null}'))
+        self.assertIsNone(parse_json_block(
+            '{"object":"error","message":"Requests rate limit exceeded","type":"rate_limited","code":"1300"}'
+        ))
+
+    def test_page_is_parsed(self):
+        block = parse_json_block('{"answer": "Answer:\\n\\n[PARAGRAPH] text", "feedback": [["text", "Good"]]}')
+        self.assertEqual(block["answer"], "Answer:\n\n[PARAGRAPH] text")
+        self.assertEqual(block["feedback"], [["text", "Good"]])
+
+    def test_marks_only_last_page_is_parsed(self):
+        block = parse_json_block('{"feedback":[["General","Good structure"]],"total_marks":"7/10"}')
+        self.assertEqual(block, {"feedback": [["General", "Good structure"]], "total_marks": "7/10"})
+
+
+class MergeJsonBlocksTest(unittest.TestCase):
+    def test_all_pages_failed_raises(self):
+        outputs = [
+            'MistralAI OCR Error on image 1: API error occurred: Status 429\n'
+            '{"object":"error","message":"Requests rate limit exceeded","type":"rate_limited","code":"1300"}',
+            "{}",
+        ]
+        with self.assertRaises(ValueError):
+            merge_json_blocks(outputs)
+
+    def test_marks_only_last_page_is_merged(self):
+        outputs = [
+            '{"question": "Q", "answer": "Answer: one", "feedback": [], "word_limit": 150, "maximum_marks": 10}',
+            '{"answer": "two", "feedback": []}',
+            '{"feedback":[["General","Good structure"]],"total_marks":"7/10"}',
+        ]
+        merged = merge_json_blocks(outputs)
+        self.assertEqual(merged["total_marks"], "7/10")
+        self.assertEqual(merged["feedback"], [["General", "Good structure"]])
+        self.assertEqual(merged["answer"], [{"text": "Answer: one\n\ntwo"}])
+
+
+if __name__ == "__main__":
+    unittest.main()